@@ -2,7 +2,10 @@
 # CAN bootloader protocol handling for MRS Microplex and CC16 modules.
 #
 
+import asyncio
 import can
+import collections
+import re
 import struct
 import time
 
@@ -48,11 +51,11 @@ PARAMETER_MAP = [
 ]
 
 # parameters we allow to be written
-PARAMETER_WRITE_OK = [
+PARAMETER_WRITE_OK = frozenset([
     'BaudrateBootloader1',
     'SoftwareVersion',
     'ModuleName'
-]
+])
 
 # encoding for BaudrateBootloader* parameters
 # (there are more below 100 but not interesting)
@@ -66,11 +69,45 @@ BAUD_MAP = {
 }
 
 
-def print_param_offsets():
+# location, format and kind of a parameter
+ParameterInfo = collections.namedtuple('ParameterInfo', ['offset', 'fmt', 'size', 'kind'])
+
+
+def _parameter_kind(fmt, name):
+    """classify a parameter as 'baud', 'str' or 'int' for set_parameter"""
+    if name.startswith('BaudrateBootloader'):
+        return 'baud'
+    if fmt[-1] == 's':
+        return 'str'
+    return 'int'
+
+
+def _parameter_index():
+    """map each name in PARAMETER_MAP to its ParameterInfo"""
+    index = dict()
     offset = 0
     for fmt, name in PARAMETER_MAP:
-        print(f'{offset:#02x}: {name}')
-        offset += struct.calcsize(fmt)
+        size = struct.calcsize(fmt)
+        index[name] = ParameterInfo(offset, fmt, size, _parameter_kind(fmt, name))
+        offset += size
+    return index
+
+
+PARAM_INDEX = _parameter_index()
+
+# valid parameter names, ignoring hidden names
+PARAMETER_NAMES = tuple(name for (_, name) in PARAMETER_MAP if name[0] != '_')
+
+# parameter formats that hold a single big-endian integer
+PARAM_INT_FORMATS = frozenset(['B', '>H', '>I', '>Q'])
+
+# compiled formats for the remaining (multi-value) parameters
+PARAM_STRUCTS = {fmt: struct.Struct(fmt) for fmt, _ in PARAMETER_MAP}
+
+
+def print_param_offsets():
+    for name, info in PARAM_INDEX.items():
+        print(f'{info.offset:#02x}: {name}')
 
 
 class MessageError(Exception):
@@ -95,8 +132,14 @@ EEPROM_ID = 0x1ffffff5
 CONSOLE_ID = 0x1ffffffe
 
 # Messages that we care about receiving
-RECEIVE_FILTER = [
+RECEIVE_FILTER = frozenset([
     ACK_ID, RSP_ID, DATA_ID, CONSOLE_ID
+])
+
+# ... as python-can filters, so that the interface can drop anything else
+CAN_FILTERS = [
+    {'can_id': can_id, 'can_mask': 0x1fffffff, 'extended': True}
+    for can_id in sorted(RECEIVE_FILTER)
 ]
 
 
@@ -105,11 +148,18 @@ class TXMessage(object):
     Abstract for messages that will be sent.
 
     Concrete classes set self._format, and pass corresponding
-    arguments to __init__.
+    arguments to __init__. The format is compiled into self._struct
+    once when the class is defined.
     """
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if '_format' in cls.__dict__:
+            cls._struct = struct.Struct(cls._format)
+
     def __init__(self, message_id, *args):
         self.raw = can.Message(arbitration_id=message_id,
-                               data=struct.pack(self._format, *args))
+                               is_extended_id=True,
+                               data=self._struct.pack(*args))
 
     def __str__(self):
         return f'{self.raw}'
@@ -136,17 +186,18 @@ class MSG_select(TXMessage):
 class MSG_read_eeprom(TXMessage):
     """requests data from the EEPROM"""
     _format = '>HHB'
+    COMMAND = 0x2003
 
     def __init__(self, address, count):
         super().__init__(CMD_ID,
-                         0x2003,
+                         self.COMMAND,
                          address,
                          count)
 
 
 class MSG_write_eeprom(TXMessage):
     """enables writing to the EEPROM"""
-    _format = '>H3c'
+    _format = '>H3s'
 
     def __init__(self):
         super().__init__(CMD_ID,
@@ -155,10 +206,19 @@ class MSG_write_eeprom(TXMessage):
 
 
 class MSG_write_eeprom_data(object):
-    """writes data to the EEPROM"""
-    def __init__(self, address, data):
-        payload = struct.pack('>H', address) + data
-        self.raw = can.Message(arbitration_id=EEPROM_ID, data=payload)
+    """
+    writes data to the EEPROM
+
+    payload is the packed address + data, see
+    Interface.eeprom_data_message()
+    """
+    def __init__(self, payload):
+        self.raw = can.Message(arbitration_id=EEPROM_ID,
+                               is_extended_id=True,
+                               data=payload)
+
+    def __str__(self):
+        return f'{self.raw}'
 
 
 class MSG_close_eeprom(TXMessage):
@@ -188,12 +248,62 @@ class MSG_erase(TXMessage):
 class MSG_srecord(object):
     """raw S-record data"""
     def __init__(self, data):
-        self.raw = can.Message(arbitration_id=SREC_ID, data=data)
+        self.raw = can.Message(arbitration_id=SREC_ID,
+                               is_extended_id=True,
+                               data=data)
 
     def __str__(self):
         return f"{self.raw}"
 
 
+def _format_fields(fmt):
+    """
+    Generator yielding (offset, format) for each item that
+    struct.unpack(fmt) would return.
+    """
+    order = fmt[0] if fmt[0] in '@=<>!' else ''
+    layout = order
+    for count, code in re.findall(r'(\d*)([a-zA-Z?])', fmt[len(order):]):
+        count = int(count) if count else 1
+        if code == 's':
+            items = [f'{count}s']
+        elif code == 'x':
+            items = []
+            layout += f'{count}x'
+        else:
+            items = [code] * count
+        for item in items:
+            offset = struct.calcsize(layout + item) - struct.calcsize(order + item)
+            yield offset, order + item
+            layout += item
+
+
+# Source for the per-class verifier built by _make_verifier(); the
+# mask and expected value are substituted as literals.
+_VERIFIER_SOURCE = """
+def _verify(self, expected_id, raw):
+    self._check_header(expected_id, raw)
+    self._values = unpack(raw.data)
+    if (from_bytes(raw.data, 'big') & {mask:#x}) != {expected:#x}:
+        self._field_error()
+"""
+
+
+def _make_verifier(cls):
+    """
+    Compile a verifier for an RXMessage subclass, specialised for its
+    format and filter.
+    """
+    source = _VERIFIER_SOURCE.format(mask=cls._mask,
+                                     expected=cls._expected)
+    namespace = {
+        'unpack': cls._struct.unpack,
+        'from_bytes': int.from_bytes,
+    }
+    exec(compile(source, f'<{cls.__name__} verifier>', 'exec'), namespace)
+    return namespace['_verify']
+
+
 class RXMessage(object):
     """
     Abstract for messages that have been received.
@@ -201,28 +311,59 @@ class RXMessage(object):
     Concretes set self._format to struct.unpack() received bytes,
     and self._filter to a list of tuple-per-unpacked-item with each
     tuple containing True/False and, if True, the required value.
+
+    When the class is defined, the format is compiled into self._struct
+    and the filter is packed into self._mask / self._expected, integers
+    matching the whole frame as a big-endian number, so that checking a
+    frame is a single compare. These are then baked into a generated
+    self._verify() for the class.
     """
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if '_format' in cls.__dict__:
+            cls._struct = struct.Struct(cls._format)
+        if '_filter' in cls.__dict__:
+            cls._checks = tuple((index, value)
+                                for (index, (check, value)) in enumerate(cls._filter)
+                                if check)
+            mask = bytearray(cls._struct.size)
+            expected = bytearray(cls._struct.size)
+            fields = list(_format_fields(cls._format))
+            for index, value in cls._checks:
+                offset, fmt = fields[index]
+                packed = struct.pack(fmt, value)
+                mask[offset:offset + len(packed)] = b'\xff' * len(packed)
+                expected[offset:offset + len(packed)] = packed
+            cls._mask = int.from_bytes(mask, 'big')
+            cls._expected = int.from_bytes(expected, 'big')
+            cls._verify = _make_verifier(cls)
+
     def __init__(self, expected_id, raw):
+        self._verify(expected_id, raw)
+
+    def _field_error(self):
+        """slow path for a frame that failed _verify(), work out which field is wrong"""
+        for (index, value) in self._checks:
+            if value != self._values[index]:
+                raise MessageError(f'reply field {index} is '
+                                   f'0x{self._values[index]} '
+                                   f'but expected {value}')
+
+    def _check_header(self, expected_id, raw):
+        """check the ID and length of the received message"""
         self.raw = raw
 
         if raw.arbitration_id != expected_id:
             raise MessageError(f'expected reply with ID {expected_id} '
                                f'but got {raw}')
-        expected_dlc = struct.calcsize(self._format)
+        expected_dlc = self._struct.size
         if raw.dlc != expected_dlc:
             raise MessageError(f'expected reply with length {expected_dlc} '
                                f'but got {raw}')
 
-        self._values = struct.unpack(self._format, raw.data)
-        for (index, (check, value)) in enumerate(self._filter):
-            if check and value != self._values[index]:
-                raise MessageError(f'reply field {index} is '
-                                   f'0x{self._values[index]} '
-                                   f'but expected {value}')
-
     @classmethod
-    def len(self):
-        return struct.calcsize(self._format)
+    def len(cls):
+        return cls._struct.size
 
 
 class MSG_ack(RXMessage):
@@ -247,20 +388,14 @@ class MSG_ack(RXMessage):
     }
 
     def __init__(self, raw):
-        super().__init__(expected_id=ACK_ID,
-                         raw=raw)
+        # no fields to check, so skip the generic filter
+        self._check_header(ACK_ID, raw)
         (self.reason_code,
          self.module_id,
          self.status_code,
-         self.sw_version) = self._values
-        try:
-            self.reason = self.REASON_MAP[self.reason_code]
-        except KeyError:
-            self.reason = 'unknown'
-        try:
-            self.status = self.STATUS_MAP[self.status_code]
-        except KeyError:
-            self.status = "unknown"
+         self.sw_version) = self._struct.unpack_from(raw.data)
+        self.reason = self.REASON_MAP.get(self.reason_code, 'unknown')
+        self.status = self.STATUS_MAP.get(self.status_code, 'unknown')
 
 
 class MSG_selected(RXMessage):
@@ -471,9 +606,20 @@ class Interface(object):
         self._power_on = False
         self._verbose = args.verbose
 
+        # scratch buffer for assembling outbound frames
+        self._tx_buf = bytearray(8)
+        self._tx_view = memoryview(self._tx_buf)
+
+        # Re-used messages for the high-volume S-record and EEPROM read
+        # traffic. The bus has finished with a message's data by the time
+        # send() returns, so these are refilled for each frame.
+        self._srec_msg = MSG_srecord(bytes(8))
+        self._read_eeprom_msg = MSG_read_eeprom(0, 0)
+
         self._bus = can.Bus(interface=args.interface_name,
                             channel=args.interface_channel,
-                            bitrate=args.bitrate * 1000)
+                            bitrate=args.bitrate * 1000,
+                            can_filters=CAN_FILTERS)
 
         if args.interface_name == 'anagate':
             self._power_agent = AnaGatePower(self._bus)
@@ -487,7 +633,7 @@ class Interface(object):
         Returns the ID of the detected module.
         """
         self.set_power_off()
-        time.sleep(0.25)
+        self.wait_power_settled()
         self.drain()
         self.set_power_t30()
         while True:
@@ -520,7 +666,7 @@ class Interface(object):
         """
         print('Scanning...')
         modules = dict()
-        scan_end_time = time.time() + 1.0
+        scan_end_time = time.monotonic() + 1.0
         self.send(MSG_ping())
         while True:
             rsp = self.recv(0.05)
@@ -535,42 +681,98 @@ class Interface(object):
                     'reason': ack.reason,
                     'sw_ver': ack.sw_version
                 }
-            elif time.time() < scan_end_time:
+            elif time.monotonic() < scan_end_time:
                 self.send(MSG_ping())
             else:
                 break
         return modules
 
-    def get_console_data(self):
-        """fetch console packets"""
-        while True:
-            msg = self.recv(1)
-            if msg is not None:
+    async def console_data(self):
+        """
+        async generator yielding console packets, reporting module resets
+
+        Received frames are delivered by a python-can Notifier on the
+        running event loop rather than polled.
+        """
+        reader = can.AsyncBufferedReader()
+        notifier = can.Notifier(self._bus, [reader], loop=asyncio.get_running_loop())
+        try:
+            while True:
+                msg = await reader.get_message()
+                if msg.arbitration_id not in RECEIVE_FILTER:
+                    continue
                 try:
                     status = MSG_ack(msg)
                     print(f'module reset due to {status.reason}')
                 except MessageError:
                     pass
                 if msg.arbitration_id == CONSOLE_ID:
-                    return msg.data
+                    yield msg.data
+        finally:
+            notifier.stop()
+
+    def _pack_frame(self, address, payload):
+        """
+        Pack an optional 16-bit address followed by payload into the
+        scratch TX buffer, return a copy of the packed frame data.
+
+        The copy is a bytearray, which can.Message adopts without copying
+        again.
+        """
+        if address is None:
+            offset = 0
+        else:
+            struct.pack_into('>H', self._tx_buf, 0, address)
+            offset = 2
+        length = offset + len(payload)
+        if length > len(self._tx_buf):
+            raise ValueError(f'frame payload too long ({length} bytes)')
+        self._tx_view[offset:length] = payload
+        return bytearray(self._tx_view[:length])
+
+    def srecord_message(self, data):
+        """
+        Return a MSG_srecord carrying (up to 8 bytes of) S-record data.
+
+        The message is re-used by the next call, so send it before then.
+        """
+        raw = self._srec_msg.raw
+        raw.data = self._pack_frame(None, data)
+        raw.dlc = len(raw.data)
+        return self._srec_msg
+
+    def read_eeprom_message(self, address, count):
+        """
+        Return a MSG_read_eeprom requesting count bytes from address.
+
+        The message is re-used by the next call, so send it before then.
+        """
+        MSG_read_eeprom._struct.pack_into(self._read_eeprom_msg.raw.data, 0,
+                                          MSG_read_eeprom.COMMAND, address, count)
+        return self._read_eeprom_msg
+
+    def eeprom_data_message(self, address, data):
+        """build a MSG_write_eeprom_data writing (up to 6 bytes of) data at address"""
+        return MSG_write_eeprom_data(self._pack_frame(address, data))
 
     def send(self, message):
         """send the message"""
 
-        self._trace(f'CAN TX: {message}')
+        self._trace('CAN TX: {}', message)
         self._bus.send(message.raw)
 
     def recv(self, timeout):
         """
         wait for a message
         """
-        now = time.time()
-        deadline = now + timeout
-        while time.time() < deadline:
-            msg = self._bus.recv(timeout=deadline - time.time())
-            if msg is not None:
-                if msg.arbitration_id in RECEIVE_FILTER:
-                    return msg
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            msg = self._bus.recv(timeout=remaining)
+            if msg is not None and msg.arbitration_id in RECEIVE_FILTER:
+                return msg
 
     def set_power_off(self):
         self._power_agent.set_power_off()
@@ -581,6 +783,21 @@ class Interface(object):
     def set_power_t30_t15(self):
         self._power_agent.set_power_t30_t15()
 
+    def wait_power_settled(self, timeout=0.25):
+        """
+        Wait for module power to settle after turning it off.
+
+        Neither power agent can tell us when the module is actually off,
+        so this waits out the timeout, but services the bus meanwhile and
+        discards anything the module sent as it went down.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._bus.recv(timeout=remaining)
+
     def drain(self):
         """
         Try to drain any buffered CAN messages - give up if the bus is
@@ -589,13 +806,19 @@ class Interface(object):
         count = 100
         while count:
             count -= 1
-            msg = self.recv(0.25)
-            if msg is None:
-                break
+            if self._bus.recv(timeout=0) is None:
+                # nothing buffered; give in-flight frames a moment to arrive
+                if self._bus.recv(timeout=0.05) is None:
+                    break
 
-    def _trace(self, msg):
+    def _trace(self, fmt, *args):
+        """print fmt.format(*args) if verbose; formatting is skipped otherwise"""
         if self._verbose:
-            print(msg)
+            print(fmt.format(*args))
+
+
+# _print_progress slices its bar out of this
+_PROGRESS_BAR = '#' * 60 + '.' * 60
 
 
 class Module(object):
@@ -603,10 +826,20 @@ class Module(object):
         self._interface = interface
         self._module_id = module_id
         self._verbose = args.verbose
+        # number of requests that may be in flight before waiting for replies;
+        # optional so that callers with their own args needn't supply it
+        self._pipeline_depth = max(1, getattr(args, 'pipeline_depth', 1))
+        # (title, hashes) last drawn by _print_progress
+        self._progress_drawn = None
 
 #        if self.parameter('_ParameterMagic') != PARAMETER_MAGIC:
 #            print(f'WARNING: EEPROM may be corrupted - bad magic number')
 
+    @property
+    def interface(self):
+        """the Interface the module is attached to"""
+        return self._interface
+
     def _cmd(self, message, reply_class=None):
         """send a message, wait for a response"""
         self._interface.send(message)
@@ -634,17 +867,28 @@ class Module(object):
 
         Note no defined DATA_ID message as it has variable length, we just poke at the
         raw CAN message instead.
+
+        Up to self._pipeline_depth read requests are sent before waiting
+        for their replies, which arrive in order.
         """
         self._select()
         result = bytearray()
-        while length > 0:
-            amount = length if length <= 8 else 8
-            rsp = self._cmd(MSG_read_eeprom(address, amount))
+        outstanding = 0
+        while (length > 0) or (outstanding > 0):
+            if (length > 0) and (outstanding < self._pipeline_depth):
+                amount = length if length <= 8 else 8
+                self._interface.send(self._interface.read_eeprom_message(address, amount))
+                length -= amount
+                address += amount
+                outstanding += 1
+                continue
+            rsp = self._interface.recv(1)
+            if rsp is None:
+                raise ModuleError('timed out waiting for a reply to EEPROM read')
+            outstanding -= 1
             if rsp.arbitration_id != DATA_ID:
                 raise ModuleError(f'unexpected reply to EEPROM read {rsp}')
-            length -= amount
-            address += amount
-            result += bytes(rsp.data)
+            result.extend(rsp.data)
         return result
 
     def _write_eeprom(self, address, data):
@@ -660,9 +904,11 @@ class Module(object):
             buf = data[:6]
             data = data[6:]
             try:
-                self._cmd(MSG_write_eeprom_data(address, buf), MSG_eeprom_write_ok)
+                self._cmd(self._interface.eeprom_data_message(address, buf),
+                          MSG_eeprom_write_ok)
             except ModuleError:
                 raise ModuleError('could not write EEPROM data')
+            address += len(buf)
         try:
             self._cmd(MSG_close_eeprom(), MSG_eeprom_closed)
         except ModuleError:
@@ -704,7 +950,12 @@ class Module(object):
         if position > limit:
             position = limit
         hashes = int(position * scale)
-        bar = '#' * hashes + '.' * (60 - hashes)
+        # only redraw when the bar changes, or to show the start / end
+        drawn = (title, hashes)
+        if (drawn == self._progress_drawn) and (0 < position < limit):
+            return
+        self._progress_drawn = drawn
+        bar = _PROGRESS_BAR[60 - hashes:120 - hashes]
         print(f'\r{title:<8} [{bar}] {position}/{limit}', end='')
 
     def _erase(self):
@@ -729,52 +980,72 @@ class Module(object):
 
     def _program(self, srecords):
         """flash srecords to the currently-selected module"""
-        progress = 1
-        records = list(srecords.upload_records())
-        memory_records = records[:-1]
-        terminal_record = records[-1]
+        # Records are streamed from the generator rather than collected
+        # up front; one is held back so that the last (terminal) record
+        # can be told apart.
+        records = srecords.upload_records()
+        srec = next(records)
 
         # send memory records (S[13])
         #
         # expected response varies based on whether this is the first, 
         # intermediate or last fragment of a record.
         progress = 0
-        progress_limit = len(memory_records) - 1
-        for srec in memory_records:
+        progress_limit = srecords.upload_record_count() - 2
+        for following in records:
 
             self._print_progress("FLASH", progress_limit, progress)
             progress += 1
             if self._verbose:
                 print(f"PGM: {srec[0:2].decode()}{srec[2:].hex()}")
 
+            # walk the record in 8-byte fragments using a cursor into a
+            # view, rather than re-slicing (and copying) the remainder
+            view = memoryview(srec)
+            offset = 0
+            length = len(srec)
+
             # do we have enough to send an initial fragment?
-            if len(srec) > 8:
-                rsp = self._cmd(MSG_srecord(srec[:8]))
-                srec = srec[8:]
+            if length - offset > 8:
+                rsp = self._cmd(self._interface.srecord_message(view[offset:offset + 8]))
+                offset += 8
                 try:
                     ack = MSG_srec_start_ok(rsp)
                 except MessageError:
                     raise ModuleError(f'unexpected response to S-record {rsp}')
 
             # do we have enough to send intermediate fragments?
-            while len(srec) > 8:
-                rsp = self._cmd(MSG_srecord(srec[:8]))
-                srec = srec[8:]
+            #
+            # Up to self._pipeline_depth fragments are sent before waiting
+            # for their replies, which arrive in order.
+            outstanding = 0
+            while (length - offset > 8) or (outstanding > 0):
+                if (length - offset > 8) and (outstanding < self._pipeline_depth):
+                    self._interface.send(self._interface.srecord_message(view[offset:offset + 8]))
+                    offset += 8
+                    outstanding += 1
+                    continue
+                rsp = self._interface.recv(1)
+                if rsp is None:
+                    raise ModuleError('timed out waiting for a reply to S-record fragment')
+                outstanding -= 1
                 try:
                     ack = MSG_srec_cont_ok(rsp)
                 except MessageError:
                     raise ModuleError(f'unexpected response to S-record {rsp}')
 
             # send the last fragment of the record
-            rsp = self._cmd(MSG_srecord(srec[:8]))
-            srec = srec[8:]
+            rsp = self._cmd(self._interface.srecord_message(view[offset:offset + 8]))
             try:
                 ack = MSG_srec_end_ok(rsp)
             except MessageError:
                 raise ModuleError(f'unexpected response to S-record {rsp}')
 
+            srec = following
+        terminal_record = srec
+
         # send the terminal record
-        rsp = self._cmd(MSG_srecord(terminal_record))
+        rsp = self._cmd(self._interface.srecord_message(terminal_record))
         try:
             ack = MSG_srecords_done(rsp)
         except MessageError:
@@ -786,54 +1057,77 @@ class Module(object):
         # point on varies considerably.
 
     def _parameter(self, parameter_name):
-        """look up a parameter by name"""
-
-        # find it in the parameter map
-        offset = 0
-        for fmt, name in PARAMETER_MAP:
-            if name == parameter_name:
-                return offset, fmt
-                address = offset
-                break
-            offset += struct.calcsize(fmt)
-        raise RuntimeError(f'attempt to lookup non-existent parameter {parameter_name}')
+        """look up a parameter by name, returns its ParameterInfo"""
+        try:
+            return PARAM_INDEX[parameter_name]
+        except KeyError:
+            raise RuntimeError(f'attempt to lookup non-existent parameter {parameter_name}')
+
+    def _decode_parameter(self, info, data):
+        """convert raw EEPROM bytes for a parameter into something usable"""
+        if info.fmt in PARAM_INT_FORMATS:
+            return f'{int.from_bytes(data, "big"):#x}'
+        if info.kind == 'str':
+            # erased / corrupt EEPROM may not be ASCII; show it rather than fail
+            return data.decode('ascii', errors='replace').rstrip('\0')
+        return PARAM_STRUCTS[info.fmt].unpack(data)
 
     def parameter(self, parameter_name):
-        address, fmt = self._parameter(parameter_name)
+        info = self._parameter(parameter_name)
         # read it from the EEPROM and make it usable
-        value = struct.unpack(fmt, self._read_eeprom(address, struct.calcsize(fmt)))
-        if fmt[-1] == 's':
-            value = value[0].decode('ascii')
-        elif len(value) == 1:
-            value = f'{value[0]:#x}'
-        return value
+        return self._decode_parameter(info, self._read_eeprom(info.offset, info.size))
+
+    def parameters_bulk(self, parameter_names):
+        """
+        generator yielding (name, value) for each of the named parameters
+
+        The EEPROM span covering all of them is fetched with one (pipelined)
+        read, rather than a separate select + read per parameter.
+        """
+        infos = [(name, self._parameter(name)) for name in parameter_names]
+        if len(infos) == 0:
+            return
+        start = min(info.offset for _, info in infos)
+        limit = max(info.offset + info.size for _, info in infos)
+        data = self._read_eeprom(start, limit - start)
+        for name, info in infos:
+            offset = info.offset - start
+            yield name, self._decode_parameter(info, data[offset:offset + info.size])
+
+    def _set_baud_parameter(self, parameter_name, info, value):
+        encoded = BAUD_MAP.get(value)
+        if encoded is None:
+            raise RuntimeError(f'unsupported CAN baudrate {value}')
+        self._write_eeprom(info.offset, encoded)
+
+    def _set_str_parameter(self, parameter_name, info, value):
+        try:
+            data = value.encode('ascii')
+        except UnicodeEncodeError:
+            raise RuntimeError(f'value "{value}" is not ASCII')
+        if len(data) > info.size:
+            raise RuntimeError(f'value "{value}" too long, max {info.fmt} bytes')
+        self._write_eeprom(info.offset, data.ljust(info.size, b'\0'))
+
+    def _set_int_parameter(self, parameter_name, info, value):
+        raise RuntimeError(f'writing {parameter_name} not supported')
+
+    _SETTER_BY_KIND = {
+        'baud': _set_baud_parameter,
+        'str': _set_str_parameter,
+        'int': _set_int_parameter,
+    }
 
     def set_parameter(self, parameter_name, value):
         if parameter_name not in PARAMETER_WRITE_OK:
             raise RuntimeError(f'parameter "{parameter_name}" not writable')
-        address, fmt = self._parameter(parameter_name)
-        if parameter_name == 'BaudrateBootloader1':
-            try:
-                self._write_eeprom(address, BAUD_MAP[value])
-            except KeyError:
-                raise RuntimeError(f'unsupported CAN baudrate {value}')
-        elif fmt[-1] == 's':
-            fmtlen = struct.calcsize(fmt)
-            if len(value) > fmtlen:
-                raise RuntimeError(f'value "{value}" too long, max {fmt} bytes')
-            while len(value) < fmtlen:
-                value += '\0'
-            self._write_eeprom(address, value.encode('ascii'))
-        else:
-            raise RuntimeError(f'writing {parameter_name} not supported')
+        info = self._parameter(parameter_name)
+        self._SETTER_BY_KIND[info.kind](self, parameter_name, info, value)
 
     @property
     def parameter_names(self):
-        """generator yielding valid parameter names"""
-        for (_, name) in PARAMETER_MAP:
-            # ignore hidden names
-            if name[0] != '_':
-                yield name
+        """tuple of valid parameter names"""
+        return PARAMETER_NAMES
 
     def upload(self, srecords):
         """flash the module with the supplied program"""
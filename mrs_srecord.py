@@ -85,15 +85,25 @@ class Srecord(object):
             adata = self._address.to_bytes(2, byteorder='big')
         elif self._flavor in '37':
             adata = self._address.to_bytes(4, byteorder='big')
-        accum = len(adata) + 1
-        for b in adata:
-            accum += b
+        accum = len(adata) + 1 + sum(adata)
         if self._data is not None:
-            accum += len(self._data)
-            for b in self._data:
-                accum += b
+            accum += len(self._data) + sum(self._data)
         return ~accum & 0xff
 
+    def upload_bytes(self):
+        """
+        The record in ready-to-send format; the first two bytes are ascii,
+        the remainder are literals. Only valid for address / data records.
+        """
+        width = 2 if self._flavor in '0159' else 4
+        data = self._data if self._data is not None else b''
+        record = bytearray(b'S' + self._flavor.encode('ascii'))
+        record.append(width + len(data) + 1)
+        record += self._address.to_bytes(width, byteorder='big')
+        record += data
+        record.append(self.check)
+        return record
+
     def __str__(self):
         if self._flavor == '0':
             address = '0000'
@@ -286,11 +296,21 @@ class S32K_Srecords(object):
 
         yield str(Srecord('7', self._image_entry, None))
 
+    def upload_record_count(self):
+        """number of records upload_records() will yield"""
+        # S3 records of 32 bytes, plus the S7
+        return ((len(self._mem_buf) + 31) // 32) + 1
+
     def upload_records(self):
         """generator yielding S-records in ready-to-send format"""
-        for srec in self.text_records(upload_only=True):
-            # first two bytes to send are ascii, remainder are literals
-            yield bytearray(srec[0:2], 'ascii') + bytes.fromhex(srec[2:])
+        # built straight from views of the memory image, rather than
+        # formatting text records and parsing them back again
+        image = memoryview(self._mem_buf)
+        for offset in range(0, len(image), 32):
+            address = self._flash_base + offset
+            yield Srecord('3', address, image[offset:offset + 32]).upload_bytes()
+
+        yield Srecord('7', self._image_entry, None).upload_bytes()
 
 
 class HCS08_Srecords(object):
@@ -391,25 +411,35 @@ class HCS08_Srecords(object):
             for line in self._s0_records:
                 yield line
 
-        addresses = sorted(self._hexbytes)
-        while len(addresses):
-
-            # address of next S1 record to emit
-            srec_addr = addresses[0]
-            srec_hexbytes = ""
-            byte_addr = srec_addr
-
-            while (byte_addr in addresses) and len(srec_hexbytes) < 64:
-                srec_hexbytes += self._hexbytes[byte_addr]
-                addresses = addresses[1:]
-                byte_addr += 1
-
+        for srec_addr, length in self._runs():
+            srec_hexbytes = ''.join(self._hexbytes[byte_addr]
+                                    for byte_addr in range(srec_addr, srec_addr + length))
             srec = f"S1{(len(srec_hexbytes) >> 1) + 3:02X}{srec_addr:04X}{srec_hexbytes}"
             srec += f"{self.sum(srec):02X}"
             yield srec
 
         yield "S9030000FC"
 
+    def _runs(self):
+        """
+        list of (address, length) for each S1 record to emit; a record
+        covers a run of up to 32 contiguous bytes
+        """
+        runs = []
+        for address in sorted(self._hexbytes):
+            if runs:
+                start, length = runs[-1]
+                if (address == start + length) and (length < 32):
+                    runs[-1] = (start, length + 1)
+                    continue
+            runs.append((address, 1))
+        return runs
+
+    def upload_record_count(self):
+        """number of records upload_records() will yield"""
+        # one S1 record per run, plus the S9
+        return len(self._runs()) + 1
+
     def upload_records(self):
         """generator yielding S-records in ready-to-send format"""
         for srec in self.text_records(upload_only=True):